@@ -1,12 +1,14 @@
 import streamlit as st
 import pandas as pd
-import requests
 import os
-from twilio.rest import Client
-from pydexcom import Dexcom, DexcomError
-from models.models import User, GlucoseReading
-from datetime import datetime, timedelta
-from utils.nightscout_api import NightscoutAPI
+import re
+import time
+from models.models import User
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import Literal
+from utils.nightscout_api import NightscoutAPI, SAMPLE_URL
 from utils.data_processor import DataProcessor
 from utils.db_utils import DatabaseManager
 from utils.alert_manager import AlertManager
@@ -14,7 +16,8 @@ from components.glucose_display import display_current_glucose
 from components.trends import plot_glucose_trend
 from components.statistics import display_statistics, plot_distribution
 from components.manual_entry import manual_entry_form
-from models.base import get_db
+from models.base import session_scope
+from models import init_db
 
 st.set_page_config(
     page_title="Diabetes Management Dashboard",
@@ -22,9 +25,116 @@ st.set_page_config(
     layout="wide"
 )
 
-# Load custom CSS
-with open('assets/style.css') as f:
-    st.markdown(f'<style>{f.read()}</style>', unsafe_allow_html=True)
+# Minimum time between alerts for one session
+ALERT_INTERVAL_SECONDS = 5 * 60
+# Environment settings that decide whether alerts can be sent
+_ALERT_ENV_VARS = ('TWILIO_ACCOUNT_SID', 'TWILIO_AUTH_TOKEN', 'TWILIO_PHONE_NUMBER', 'EMAIL_PASSWORD')
+
+_EMAIL_RE = re.compile(r'^[^@\s]+@[^@\s]+\.[^@\s]+$')
+# Everything except digits and '+'
+_PHONE_STRIP_RE = re.compile(r'[^\d+]')
+
+# Advice shown when the current reading is outside the target range
+_HIGH_ADVICE = """
+### Your glucose is above your target range
+
+Here are some steps you can take to help lower your glucose levels:
+
+**Immediate actions:**
+- Drink water to stay hydrated and help your kidneys flush out excess glucose
+- Take a brief walk or do light physical activity (if approved by your healthcare provider)
+- If taking insulin, check with your healthcare provider if an adjustment is needed
+
+**Prevention tips:**
+- Check your carbohydrate intake from recent meals
+- Monitor for patterns at this time of day
+- Record any unusual food, activity, or stress in your notes
+
+**When to seek help:**
+- If glucose remains high for several hours
+- If you experience excessive thirst, frequent urination, fatigue, or blurred vision
+- If glucose exceeds 250 mg/dL consistently
+
+*Always follow your healthcare provider's specific guidance for your diabetes management.*
+"""
+
+_LOW_ADVICE = """
+### Your glucose is below your target range
+
+Here are some steps you can take to raise your glucose levels safely:
+
+**Immediate actions:**
+- Follow the 15-15 rule: Consume 15 grams of fast-acting carbohydrates, wait 15 minutes, then recheck
+- Examples of 15g carbs: 4 oz fruit juice, 1 tablespoon honey, 3-4 glucose tablets
+- If still low after 15 minutes, repeat the process
+
+**After recovery:**
+- Eat a small balanced snack with protein once levels normalize (cheese and crackers, nut butter)
+- Rest and monitor your symptoms
+- Record the episode in your notes, including what you ate and possible triggers
+
+**When to seek help:**
+- If glucose remains below 70 mg/dL after two treatments
+- If you experience confusion, difficulty speaking, or inability to swallow
+- If you lose consciousness (family members should call emergency services)
+
+*Always follow your healthcare provider's specific guidance for your diabetes management.*
+"""
+
+@st.cache_resource(show_spinner=False)
+def _alert_pool():
+    """Worker threads that send SMS/email alerts off the render path"""
+    return ThreadPoolExecutor(max_workers=2)
+
+@st.cache_data(show_spinner=False, max_entries=8, hash_funcs={pd.DataFrame: DataProcessor.fingerprint})
+def _process(df):
+    """Processed history, recomputed only when the readings change"""
+    return DataProcessor.process_glucose_data(df.copy())
+
+@st.cache_data(show_spinner=False, max_entries=8, hash_funcs={pd.DataFrame: DataProcessor.fingerprint})
+def _statistics(df):
+    """Summary statistics, recomputed only when the readings change"""
+    return DataProcessor.calculate_statistics(df)
+
+@st.cache_data(ttl=60, show_spinner=False)
+def _can_send_alerts(*credentials):
+    """AlertManager.can_send_alerts, cached per set of alert credentials"""
+    return AlertManager.can_send_alerts()
+
+def alerts_configured():
+    """Whether SMS or email alerts can be sent; rechecked when credentials change"""
+    return _can_send_alerts(*(os.getenv(name) for name in _ALERT_ENV_VARS))
+
+@st.cache_data(show_spinner=False)
+def _load_css(path):
+    """Read a stylesheet once; later reruns reuse the cached text"""
+    with open(path) as f:
+        return f.read()
+
+@st.cache_resource(show_spinner=False)
+def get_api(nightscout_url):
+    """One Nightscout client per URL, shared by every rerun and session"""
+    return NightscoutAPI(nightscout_url)
+
+@st.cache_data(ttl=60, show_spinner=False)
+def _fetch_current(nightscout_url):
+    """Latest reading, reused across reruns for a minute (CGMs update every 5)
+
+    The display time is formatted here so it is computed once per fetch.
+    """
+    glucose = get_api(nightscout_url).get_current_glucose()
+    if glucose and glucose.get('date'):
+        glucose = {**glucose, 'ts_str': datetime.fromtimestamp(glucose['date'] / 1000).strftime('%I:%M %p')}
+    return glucose
+
+@lru_cache(maxsize=None)
+def _classify(glucose_value, low_threshold, high_threshold) -> Literal['low', 'normal', 'high']:
+    """Where a reading falls relative to the user's alert thresholds"""
+    if glucose_value > high_threshold:
+        return 'high'
+    if glucose_value < low_threshold:
+        return 'low'
+    return 'normal'
 
 def initialize_session_state():
     if 'user_email' not in st.session_state:
@@ -39,17 +149,105 @@ def initialize_session_state():
         st.session_state.high_threshold = 180
     if 'low_threshold' not in st.session_state:
         st.session_state.low_threshold = 70
+    if 'history_window' not in st.session_state:
+        st.session_state.history_window = None
+    if 'last_ts_ms' not in st.session_state:
+        st.session_state.last_ts_ms = 0
+    if 'last_alert_ts' not in st.session_state:
+        st.session_state.last_alert_ts = 0
+    if 'settings_applied' not in st.session_state:
+        st.session_state.settings_applied = False
+
+@st.fragment(run_every=60)
+def current_glucose_panel(nightscout_url, user_id, user_email):
+    """Current reading, advice and alerts; reruns by itself every minute"""
+    # Fetch and store current glucose; timed reruns happen outside main()'s error handling
+    try:
+        current_glucose = _fetch_current(nightscout_url)
+    except Exception as e:
+        st.error(f"Error: {str(e)}")
+        return
+
+    if current_glucose:
+        try:
+            # Already-stored readings are skipped, so reruns don't duplicate them
+            with session_scope() as db:
+                DatabaseManager.bulk_save_readings(db, db.get(User, user_id), [{
+                    'glucose_value': float(current_glucose['sgv']),
+                    'timestamp': pd.to_datetime(current_glucose['date'], unit='ms').to_pydatetime(),
+                    'source': 'nightscout'
+                }])
+        except Exception as e:
+            st.warning(f"Could not save current glucose reading: {str(e)}")
+
+    display_current_glucose(current_glucose)
+
+    # Classify the current value once; advice and alerts both use it
+    glucose_value = current_glucose.get('sgv', 0) if current_glucose else 0
+    status = _classify(glucose_value, st.session_state.low_threshold, st.session_state.high_threshold)
+
+    # Show advice based on glucose levels, even if alerts are disabled
+    if status == 'high':
+        with st.expander("📋 Glucose Management Advice (HIGH)", expanded=True):
+            st.markdown(_HIGH_ADVICE)
+    elif status == 'low':
+        with st.expander("📋 Glucose Management Advice (LOW)", expanded=True):
+            st.markdown(_LOW_ADVICE)
+
+    # Check if we need to send alerts based on current glucose
+    # Skip if an alert went out recently so reruns don't repeat the SMS
+    if (status != 'normal' and
+        st.session_state.enable_alerts and 
+        (st.session_state.phone_number or user_email) and 
+        current_glucose and 
+        time.time() - st.session_state.last_alert_ts >= ALERT_INTERVAL_SECONDS and
+        alerts_configured()):
+
+        timestamp = datetime.fromtimestamp(current_glucose.get('date', 0) / 1000)
+
+        # Send alerts through both SMS and email
+        phone = st.session_state.phone_number if st.session_state.phone_number else None
+        email = user_email if user_email else None
+
+        # Send in the background so Twilio/SMTP latency doesn't block the page
+        _alert_pool().submit(
+            AlertManager.send_glucose_alert,
+            to_number=phone,
+            to_email=email,
+            glucose_value=glucose_value,
+            timestamp=timestamp,
+            alert_type=status
+        )
+        st.session_state.last_alert_ts = time.time()
+        st.warning(f"{status.capitalize()} glucose alert sent ({glucose_value} mg/dL)")
+
+def load_history(nightscout_url, hours):
+    """Return the history window and the readings this session hasn't seen yet
+
+    The window itself is kept up to date incrementally by the shared API client;
+    the session only tracks the newest reading it has already handled.
+    """
+    window = (nightscout_url, hours)
+    if st.session_state.history_window != window:
+        st.session_state.history_window = window
+        st.session_state.last_ts_ms = 0
+
+    history = get_api(nightscout_url).get_glucose_window(hours)
+    if history.empty:
+        return history, history
+
+    new_readings = history[history['date'] > st.session_state.last_ts_ms]
+    st.session_state.last_ts_ms = int(history['date'].max())
+    return history, new_readings
 
 def validate_email(email):
     """Simple email validation"""
-    if '@' in email and '.' in email:
-        return True
-    return False
+    return _EMAIL_RE.match(email) is not None
 
 def validate_phone(phone):
     """Simple phone number validation"""
     # Remove spaces, dashes, and parentheses
-    clean_phone = ''.join(c for c in phone if c.isdigit() or c == '+')
+    clean_phone = _PHONE_STRIP_RE.sub('', phone)
     # Must have at least 10 digits and start with + or a digit
     if len(clean_phone) >= 10 and (clean_phone[0].isdigit() or clean_phone[0] == '+'):
         return True
@@ -58,6 +256,7 @@ def validate_phone(phone):
 
 
 def main():
+    init_db()
     initialize_session_state()
     st.title("Diabetes Management Dashboard")
 
@@ -65,21 +264,39 @@ def main():
     st.sidebar.title("Settings")
 
     
-    # User login/setup with improved guidance
-    user_email = st.sidebar.text_input(
-        "Email Address",
-        help="Enter your personal email address (e.g., yourname@gmail.com). This will be used to save your data and preferences."
-    )
+    # Settings are applied together on submit, so typing doesn't trigger data fetches
+    with st.sidebar.form("settings"):
+        # User login/setup with improved guidance
+        user_email = st.text_input(
+            "Email Address",
+            help="Enter your personal email address (e.g., yourname@gmail.com). This will be used to save your data and preferences."
+        )
+
+        phone_number = st.text_input(
+            "Phone Number",
+            help="Enter your phone number for alerts and notifications (e.g., +1234567890)"
+        )
+
+        nightscout_url = st.text_input(
+            "Nightscout URL",
+            value=SAMPLE_URL,
+            help="Enter your Nightscout URL. Don't have one? Click the button below for setup instructions."
+        )
+
+        time_range = st.selectbox(
+            "Time Range",
+            options=[6, 12, 24, 48],
+            index=2,
+            help="Select time range in hours"
+        )
+
+        if st.form_submit_button("Apply"):
+            st.session_state.settings_applied = True
 
     if user_email and not validate_email(user_email):
         st.sidebar.error("Please enter a valid email address")
         return
-        
-    phone_number = st.sidebar.text_input(
-        "Phone Number",
-        help="Enter your phone number for alerts and notifications (e.g., +1234567890)"
-    )
-    
+
     # Validate and store phone number in session state
     if phone_number:
         if validate_phone(phone_number):
@@ -89,18 +306,6 @@ def main():
             st.sidebar.error("Please enter a valid phone number (must include area code)")
             st.session_state.phone_number = None
 
-    nightscout_url = st.sidebar.text_input(
-        "Nightscout URL",
-        value="https://your-nightscout-url.herokuapp.com",
-        help="Enter your Nightscout URL. Don't have one? Click the button below for setup instructions."
-    )
-
-    time_range = st.sidebar.selectbox(
-        "Time Range",
-        options=[6, 12, 24, 48],
-        index=2,
-        help="Select time range in hours"
-    )
     st.session_state.time_range = time_range
 
     # Add SMS Alert settings if phone number is valid
@@ -142,7 +347,7 @@ def main():
                 st.session_state.high_threshold = high_threshold
             
             # Check if Twilio is configured
-            if not AlertManager.can_send_alerts():
+            if not alerts_configured():
                 st.sidebar.warning("⚠️ SMS alerts require Twilio configuration. Please add your Twilio credentials in the settings.")
                 
                 # Optional Twilio credentials input
@@ -173,179 +378,74 @@ def main():
         Would you like help setting these up? Just ask!
         """)
 
-    if user_email and nightscout_url:
+    if st.sidebar.button("Refresh Glucose Data"):
+        _fetch_current.clear()
+        if nightscout_url:
+            get_api(nightscout_url).clear_cache()
+
+    if user_email and nightscout_url and st.session_state.settings_applied:
         try:
-            # Get database session
-            db = next(get_db())
-
-            # Get or create user
-            user = DatabaseManager.get_or_create_user(
-                db=db, 
-                email=user_email, 
-                nightscout_url=nightscout_url, 
-                phone_number=st.session_state.phone_number
-            )
-
-            if not user:
-                st.error("Failed to create or retrieve user")
-                return
-
-            st.session_state.user_email = user_email
-
-            # Initialize API client
-            api = NightscoutAPI(nightscout_url)
-
-            # Fetch and store current glucose
-            current_glucose = api.get_current_glucose()
-
-            if current_glucose:
-                try:
-                    # Pass the whole user object to avoid ID issues
-                    DatabaseManager.save_glucose_reading(
-                        db=db,
-                        user=user,
-                        glucose_value=float(current_glucose['sgv']),
-                        timestamp=datetime.fromtimestamp(current_glucose['date'] / 1000),
-                        source='nightscout'
-                    )
-                except Exception as e:
-                    st.warning(f"Could not save current glucose reading: {str(e)}")
-
-            # Main content area
-            col1, col2 = st.columns([2, 1])
+            # This thread's session, returned to the pool when the block exits
+            with session_scope() as db:
+                # Get or create user
+                user = DatabaseManager.get_or_create_user(
+                    db=db, 
+                    email=user_email, 
+                    nightscout_url=nightscout_url, 
+                    phone_number=st.session_state.phone_number
+                )
 
-            with col1:
-                display_current_glucose(current_glucose)
-                
-                # Get current glucose value
-                glucose_value = current_glucose.get('sgv', 0) if current_glucose else 0
-                
-                # Show advice based on glucose levels, even if alerts are disabled
-                if glucose_value > st.session_state.high_threshold:
-                    with st.expander("📋 Glucose Management Advice (HIGH)", expanded=True):
-                        st.markdown("""
-                        ### Your glucose is above your target range
-                        
-                        Here are some steps you can take to help lower your glucose levels:
-                        
-                        **Immediate actions:**
-                        - Drink water to stay hydrated and help your kidneys flush out excess glucose
-                        - Take a brief walk or do light physical activity (if approved by your healthcare provider)
-                        - If taking insulin, check with your healthcare provider if an adjustment is needed
-                        
-                        **Prevention tips:**
-                        - Check your carbohydrate intake from recent meals
-                        - Monitor for patterns at this time of day
-                        - Record any unusual food, activity, or stress in your notes
-                        
-                        **When to seek help:**
-                        - If glucose remains high for several hours
-                        - If you experience excessive thirst, frequent urination, fatigue, or blurred vision
-                        - If glucose exceeds 250 mg/dL consistently
-                        
-                        *Always follow your healthcare provider's specific guidance for your diabetes management.*
-                        """)
-                elif glucose_value < st.session_state.low_threshold:
-                    with st.expander("📋 Glucose Management Advice (LOW)", expanded=True):
-                        st.markdown("""
-                        ### Your glucose is below your target range
-                        
-                        Here are some steps you can take to raise your glucose levels safely:
-                        
-                        **Immediate actions:**
-                        - Follow the 15-15 rule: Consume 15 grams of fast-acting carbohydrates, wait 15 minutes, then recheck
-                        - Examples of 15g carbs: 4 oz fruit juice, 1 tablespoon honey, 3-4 glucose tablets
-                        - If still low after 15 minutes, repeat the process
-                        
-                        **After recovery:**
-                        - Eat a small balanced snack with protein once levels normalize (cheese and crackers, nut butter)
-                        - Rest and monitor your symptoms
-                        - Record the episode in your notes, including what you ate and possible triggers
-                        
-                        **When to seek help:**
-                        - If glucose remains below 70 mg/dL after two treatments
-                        - If you experience confusion, difficulty speaking, or inability to swallow
-                        - If you lose consciousness (family members should call emergency services)
-                        
-                        *Always follow your healthcare provider's specific guidance for your diabetes management.*
-                        """)
-                
-                # Check if we need to send alerts based on current glucose
-                if (st.session_state.enable_alerts and 
-                    (st.session_state.phone_number or user_email) and 
-                    current_glucose and 
-                    AlertManager.can_send_alerts()):
-                    
-                    glucose_value = current_glucose.get('sgv', 0)
-                    timestamp = datetime.fromtimestamp(current_glucose.get('date', 0) / 1000)
-                    
-                    # Check for high glucose alert
-                    if glucose_value > st.session_state.high_threshold:
-                        # Send alerts through both SMS and email
-                        phone = st.session_state.phone_number if st.session_state.phone_number else None
-                        email = user_email if user_email else None
-                        
-                        AlertManager.send_glucose_alert(
-                            to_number=phone,
-                            to_email=email,
-                            glucose_value=glucose_value,
-                            timestamp=timestamp,
-                            alert_type="high"
-                        )
-                        st.sidebar.warning(f"High glucose alert sent ({glucose_value} mg/dL)")
-                    
-                    # Check for low glucose alert
-                    elif glucose_value < st.session_state.low_threshold:
-                        # Send alerts through both SMS and email
-                        phone = st.session_state.phone_number if st.session_state.phone_number else None
-                        email = user_email if user_email else None
-                        
-                        AlertManager.send_glucose_alert(
-                            to_number=phone,
-                            to_email=email,
-                            glucose_value=glucose_value,
-                            timestamp=timestamp,
-                            alert_type="low"
-                        )
-                        st.sidebar.warning(f"Low glucose alert sent ({glucose_value} mg/dL)")
-
-            # Fetch historical data
-            df = api.get_glucose_data(hours=time_range)
-            if not df.empty:
-                # Store new readings in database
-                for _, row in df.iterrows():
-                    try:                            
-                        DatabaseManager.save_glucose_reading(
-                            db=db,
-                            user=user,
-                            glucose_value=float(row['sgv']),
-                            timestamp=datetime.fromtimestamp(row['date'] / 1000),
-                            source='nightscout'
-                        )
+                if not user:
+                    st.error("Failed to create or retrieve user")
+                    return
+
+                st.session_state.user_email = user_email
+
+                # Main content area
+                col1, col2 = st.columns([2, 1])
+
+                with col1:
+                    current_glucose_panel(nightscout_url, user.id, user_email)
+
+                # Fetch historical data
+                history, new_readings = load_history(nightscout_url, time_range)
+                if not new_readings.empty:
+                    # Store only readings that arrived since the last poll, in a single insert
+                    timestamps = pd.to_datetime(new_readings['date'].to_numpy(), unit='ms').to_pydatetime()
+                    sgvs = new_readings['sgv'].to_numpy(dtype=float).tolist()
+                    try:
+                        DatabaseManager.bulk_save_readings(db, user, [
+                            {'glucose_value': sgv, 'timestamp': ts, 'source': 'nightscout'}
+                            for sgv, ts in zip(sgvs, timestamps)
+                        ])
                     except Exception as e:
-                        continue  # Skip failed entries but continue processing
+                        st.warning(f"Could not save glucose history: {str(e)}")
 
-                df = DataProcessor.process_glucose_data(df)
+                if not history.empty:
+                    df = _process(history)
 
-                # Display trend chart
-                plot_glucose_trend(df)
+                    # Display trend chart
+                    plot_glucose_trend(df)
 
-                # Calculate and display statistics
-                stats = DataProcessor.calculate_statistics(df)
-                display_statistics(stats)
+                    # Calculate and display statistics
+                    stats = _statistics(df)
+                    display_statistics(stats)
 
-                # Show distribution
-                plot_distribution(df)
+                    # Show distribution
+                    plot_distribution(df)
 
-            # Manual entry section
-            st.markdown("---")
-            manual_entry_form(db, user)
+                # Manual entry section
+                st.markdown("---")
+                manual_entry_form(db, user)
 
         except Exception as e:
             st.error(f"Error: {str(e)}")
             st.info("Please check your settings and try again.")
     else:
-        st.info("Please enter your email address and Nightscout URL to get started.")
+        st.info("Please enter your email address and Nightscout URL, then click Apply to get started.")
+
+# Load custom CSS
+st.markdown(f'<style>{_load_css("assets/style.css")}</style>', unsafe_allow_html=True)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
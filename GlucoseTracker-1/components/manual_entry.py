@@ -1,8 +1,65 @@
 import streamlit as st
 import pandas as pd
+import numpy as np
 from datetime import datetime
 from utils.db_utils import DatabaseManager
 from sqlalchemy.orm import Session
+from typing import Optional
+
+# Static markup, built once at import rather than on every rerun
+_FORM_HEADER_HTML = """
+<div style="background: white; padding: 20px; border-radius: 15px; 
+          box-shadow: 0 4px 10px rgba(0,0,0,0.1); margin-bottom: 20px;
+          border-left: 8px solid #10b981;">
+<h2 style="color: #10b981; margin-bottom: 15px;">Manual Data Entry</h2>
+<p style="color: #4b5563; margin-bottom: 20px;">
+    Use this form to manually log glucose readings that aren't captured by your CGM.
+</p>
+"""
+_LOW_LABEL_HTML = '<p style="color: #eab308; font-weight: 500; margin-top: -15px;">Low</p>'
+_HIGH_LABEL_HTML = '<p style="color: #ef4444; font-weight: 500; margin-top: -15px;">High</p>'
+_IN_RANGE_LABEL_HTML = '<p style="color: #22c55e; font-weight: 500; margin-top: -15px;">In Range</p>'
+_TAGS_LABEL_HTML = '<p style="color: #4b5563; font-size: 0.9rem; margin-bottom: 5px;">Tags (optional)</p>'
+_RECENT_HEADER_HTML = '<h3 style="color: #10b981; margin-top: 20px; margin-bottom: 15px;">Recent Entries</h3>'
+
+# Checkbox key -> tag appended to the entry notes, in display order
+_TAG_MAP = (
+    ('meal', '#meal'),
+    ('exercise', '#exercise'),
+    ('medication', '#medication'),
+    ('stress', '#stress')
+)
+
+def _color_glucose(values: pd.Series) -> np.ndarray:
+    """Cell styles for a column of glucose values: low, high or in range"""
+    return np.select(
+        [values < 70, values > 180],
+        [
+            'background-color: rgba(234, 179, 8, 0.2); color: #854d0e; font-weight: bold',
+            'background-color: rgba(239, 68, 68, 0.2); color: #991b1b; font-weight: bold'
+        ],
+        default='background-color: rgba(34, 197, 94, 0.2); color: #166534; font-weight: bold'
+    )
+
+@st.cache_data(ttl=30, show_spinner=False)
+def _recent_df(_db: Session, user_id: int, version: Optional[int]) -> pd.DataFrame:
+    """Last 24h of readings as a DataFrame
+
+    The cache is shared by every session, so version is the user's latest
+    reading id from the database: a save from any tab changes it.
+    """
+    readings = DatabaseManager.get_user_readings(_db, user_id, hours=24)
+    return pd.DataFrame([{
+        'datetime': r.timestamp,
+        'glucose': r.glucose_value,
+        'source': r.source,
+        'notes': r.notes
+    } for r in readings])
+
+@st.cache_data(ttl=30, show_spinner=False)
+def _csv_bytes(_db: Session, user_id: int, version: Optional[int]) -> bytes:
+    """CSV export of the recent readings, serialized once per latest reading id"""
+    return _recent_df(_db, user_id, version).to_csv(index=False).encode()
 
 def manual_entry_form(db: Session, user):
     """Form for manual glucose entry with enhanced styling"""
@@ -10,15 +67,7 @@ def manual_entry_form(db: Session, user):
     user_id = user.id
     
     # Create a styled container
-    st.markdown("""
-    <div style="background: white; padding: 20px; border-radius: 15px; 
-              box-shadow: 0 4px 10px rgba(0,0,0,0.1); margin-bottom: 20px;
-              border-left: 8px solid #10b981;">
-    <h2 style="color: #10b981; margin-bottom: 15px;">Manual Data Entry</h2>
-    <p style="color: #4b5563; margin-bottom: 20px;">
-        Use this form to manually log glucose readings that aren't captured by your CGM.
-    </p>
-    """, unsafe_allow_html=True)
+    st.markdown(_FORM_HEADER_HTML, unsafe_allow_html=True)
 
     with st.form("manual_entry"):
         # Styled form with columns
@@ -35,11 +84,11 @@ def manual_entry_form(db: Session, user):
             
             # Show a colored indicator based on the value
             if glucose < 70:
-                st.markdown('<p style="color: #eab308; font-weight: 500; margin-top: -15px;">Low</p>', unsafe_allow_html=True)
+                st.markdown(_LOW_LABEL_HTML, unsafe_allow_html=True)
             elif glucose > 180:
-                st.markdown('<p style="color: #ef4444; font-weight: 500; margin-top: -15px;">High</p>', unsafe_allow_html=True)
+                st.markdown(_HIGH_LABEL_HTML, unsafe_allow_html=True)
             else:
-                st.markdown('<p style="color: #22c55e; font-weight: 500; margin-top: -15px;">In Range</p>', unsafe_allow_html=True)
+                st.markdown(_IN_RANGE_LABEL_HTML, unsafe_allow_html=True)
         
         with col2:
             date = st.date_input(
@@ -59,7 +108,7 @@ def manual_entry_form(db: Session, user):
         )
         
         # Tags selector
-        st.markdown('<p style="color: #4b5563; font-size: 0.9rem; margin-bottom: 5px;">Tags (optional)</p>', unsafe_allow_html=True)
+        st.markdown(_TAGS_LABEL_HTML, unsafe_allow_html=True)
         
         col1, col2, col3, col4 = st.columns(4)
         with col1:
@@ -72,13 +121,8 @@ def manual_entry_form(db: Session, user):
             stress = st.checkbox("Stress")
         
         # Add tags to notes if selected
-        tags = []
-        if meal: tags.append("#meal")
-        if exercise: tags.append("#exercise")
-        if medication: tags.append("#medication")
-        if stress: tags.append("#stress")
-        
-        tags_str = " ".join(tags)
+        selected = {'meal': meal, 'exercise': exercise, 'medication': medication, 'stress': stress}
+        tags_str = " ".join(tag for key, tag in _TAG_MAP if selected[key])
         if tags_str and notes:
             notes = f"{notes}\n\nTags: {tags_str}"
         elif tags_str:
@@ -101,46 +145,31 @@ def manual_entry_form(db: Session, user):
                     notes=notes
                 )
 
-                st.success("✅ Entry saved successfully!")
+                if reading is None:
+                    st.warning("An entry already exists for this date and time.")
+                else:
+                    st.success("✅ Entry saved successfully!")
             except Exception as e:
                 st.error(f"❌ Error saving entry: {str(e)}")
 
     # Display manual entries in a styled table
-    readings = DatabaseManager.get_user_readings(db, user_id, hours=24)
-    if readings:
-        st.markdown("""
-        <h3 style="color: #10b981; margin-top: 20px; margin-bottom: 15px;">Recent Entries</h3>
-        """, unsafe_allow_html=True)
+    version = DatabaseManager.latest_reading_id(db, user_id)
+    df = _recent_df(db, user_id, version)
+    if not df.empty:
+        st.markdown(_RECENT_HEADER_HTML, unsafe_allow_html=True)
 
-        # Convert to DataFrame
-        df = pd.DataFrame([{
-            'datetime': r.timestamp,
-            'glucose': r.glucose_value,
-            'source': r.source,
-            'notes': r.notes
-        } for r in readings])
-        
-        # Style the dataframe
-        df_styled = df.copy()
-        df_styled['datetime'] = df_styled['datetime'].dt.strftime('%Y-%m-%d %I:%M %p')
         # Filter to only show manual entries
-        manual_entries = df_styled[df_styled['source'] == 'manual']
+        manual_entries = df.loc[df['source'].eq('manual')]
         
         if not manual_entries.empty:
-            # Apply color formatting based on glucose values
-            def color_glucose(val):
-                if val < 70:
-                    return f'background-color: rgba(234, 179, 8, 0.2); color: #854d0e; font-weight: bold'
-                elif val > 180:
-                    return f'background-color: rgba(239, 68, 68, 0.2); color: #991b1b; font-weight: bold'
-                else:
-                    return f'background-color: rgba(34, 197, 94, 0.2); color: #166534; font-weight: bold'
-            
-            # Apply the style
-            styled_df = manual_entries.style.applymap(color_glucose, subset=['glucose'])
+            # Apply color formatting based on glucose values, one pass over the column
+            styled_df = manual_entries.style.apply(_color_glucose, subset=['glucose'])
             
-            # Display with prettier column names
-            styled_df = styled_df.format({'glucose': '{:.0f} mg/dL'})
+            # Display with prettier column names; formatting is display-only, the data is untouched
+            styled_df = styled_df.format({
+                'datetime': lambda ts: ts.strftime('%Y-%m-%d %I:%M %p'),
+                'glucose': '{:.0f} mg/dL'
+            })
             
             # Hide index - use updated Pandas styling method depending on version
             try:
@@ -160,10 +189,9 @@ def manual_entry_form(db: Session, user):
             col1, col2 = st.columns([3, 1])
             
             with col2:
-                csv = df.to_csv(index=False)
                 st.download_button(
                     label="📊 Export as CSV",
-                    data=csv,
+                    data=_csv_bytes(db, user_id, version),
                     file_name="glucose_readings.csv",
                     mime="text/csv",
                     help="Download all your glucose readings as a CSV file"
@@ -1,24 +1,69 @@
 import streamlit as st
+import numpy as np
+import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
 from plotly.subplots import make_subplots
+from utils.data_processor import DataProcessor
 
+# Histogram bins: 5 mg/dL wide up to 200, then wider through the sparse high tail.
+# Bar heights are divided by bin width so wide bins aren't overstated.
+_BIN_EDGES = np.concatenate([np.arange(40, 200, 5), [220, 260, 320, 400]])
+_BIN_WIDTHS = np.diff(_BIN_EDGES)
+_BIN_CENTERS = _BIN_EDGES[:-1] + _BIN_WIDTHS / 2
+
+# Range bands, boundary lines and labels for the distribution; static, so
+# they are built once and passed to update_layout in a single call
+_DISTRIBUTION_SHAPES = [
+    # Coloured regions for Low, Normal, and High
+    dict(type="rect", x0=0, x1=70, y0=0, y1=1, yref="paper",
+         fillcolor="rgba(234, 179, 8, 0.2)", line=dict(width=0), layer="below"),
+    dict(type="rect", x0=70, x1=180, y0=0, y1=1, yref="paper",
+         fillcolor="rgba(34, 197, 94, 0.2)", line=dict(width=0), layer="below"),
+    dict(type="rect", x0=180, x1=400, y0=0, y1=1, yref="paper",
+         fillcolor="rgba(239, 68, 68, 0.2)", line=dict(width=0), layer="below"),
+    # Target range boundaries
+    dict(type="line", x0=70, x1=70, y0=0, y1=1, yref="paper",
+         line=dict(color="rgba(34, 197, 94, 0.8)", width=2, dash="dash")),
+    dict(type="line", x0=180, x1=180, y0=0, y1=1, yref="paper",
+         line=dict(color="rgba(239, 68, 68, 0.8)", width=2, dash="dash")),
+]
+_DISTRIBUTION_ANNOTATIONS = [
+    dict(x=50, y=0.95, text="Low", showarrow=False, yref="paper",
+         font=dict(size=12, color="#4b5563")),
+    dict(x=125, y=0.95, text="Target Range", showarrow=False, yref="paper",
+         font=dict(size=12, color="#4b5563")),
+    dict(x=240, y=0.95, text="High", showarrow=False, yref="paper",
+         font=dict(size=12, color="#4b5563")),
+]
+
+# Static markup is built once at import; only the values are filled in per render
+_PANEL_OPEN = (
+    '<div style="background: white; padding: 20px; border-radius: 15px; '
+    'box-shadow: 0 4px 10px rgba(0,0,0,0.1); margin-bottom: 20px; border-left: 8px solid #10b981;">'
+)
+_PANEL_CLOSE = '</div>'
+_STATS_HEADER = _PANEL_OPEN + '<h2 style="color: #10b981; margin-bottom: 15px;">Glucose Statistics</h2>'
+_DISTRIBUTION_HEADER = _PANEL_OPEN + '<h2 style="color: #10b981; margin-bottom: 15px;">Glucose Distribution</h2>'
+_ROW_OPEN = '<div style="display: flex; gap: 15px;">'
+_MINMAX_ROW_OPEN = '<div style="display: flex; margin-top: 15px; gap: 15px;">'
+_ROW_CLOSE = '</div>'
+_CARD_TPL = (
+    '<div style="flex: 1; background: rgba(16, 185, 129, 0.05); padding: 15px; border-radius: 12px; text-align: center;">'
+    '<div style="color: #4b5563; font-size: 1rem;">{label}</div>'
+    '<div style="font-size: {size}; font-weight: bold; color: {color};">{value}</div>'
+    '{note}'
+    '</div>'
+)
+_NOTE_TPL = '<div style="font-size: 0.9rem; color: #4b5563; margin-top: 5px;">{}</div>'
+
+@st.fragment
 def display_statistics(stats):
     """Display glucose statistics with enhanced styling"""
     if not stats:
         st.warning("⚠️ No data available for statistics")
         return
     
-    st.markdown("""
-    <div style="background: white; padding: 20px; border-radius: 15px; 
-              box-shadow: 0 4px 10px rgba(0,0,0,0.1); margin-bottom: 20px;
-              border-left: 8px solid #10b981;">
-    <h2 style="color: #10b981; margin-bottom: 15px;">Glucose Statistics</h2>
-    """, unsafe_allow_html=True)
-    
-    # Create a row with 3 metrics in styled cards
-    col1, col2, col3 = st.columns(3)
-
     # Determine colors based on values
     avg_color = "#22c55e" if 70 <= stats['average'] <= 180 else "#ef4444"
     range_color = "#22c55e" if stats['in_range'] >= 70 else (
@@ -27,161 +72,47 @@ def display_statistics(stats):
     std_color = "#22c55e" if stats['std'] < 40 else (
         "#eab308" if stats['std'] < 60 else "#ef4444"
     )
-    
-    with col1:
-        st.markdown(f"""
-        <div style="background: rgba(16, 185, 129, 0.05); padding: 15px; border-radius: 12px; text-align: center;">
-            <div style="color: #4b5563; font-size: 1rem;">Average Glucose</div>
-            <div style="font-size: 2rem; font-weight: bold; color: {avg_color};">{stats['average']:.0f} mg/dL</div>
-            <div style="font-size: 0.9rem; color: #4b5563; margin-top: 5px;">Target: 70-180 mg/dL</div>
-        </div>
-        """, unsafe_allow_html=True)
-    
-    with col2:
-        st.markdown(f"""
-        <div style="background: rgba(16, 185, 129, 0.05); padding: 15px; border-radius: 12px; text-align: center;">
-            <div style="color: #4b5563; font-size: 1rem;">Time in Range</div>
-            <div style="font-size: 2rem; font-weight: bold; color: {range_color};">{stats['in_range']:.1f}%</div>
-            <div style="font-size: 0.9rem; color: #4b5563; margin-top: 5px;">Target: >70%</div>
-        </div>
-        """, unsafe_allow_html=True)
-    
-    with col3:
-        st.markdown(f"""
-        <div style="background: rgba(16, 185, 129, 0.05); padding: 15px; border-radius: 12px; text-align: center;">
-            <div style="color: #4b5563; font-size: 1rem;">Standard Deviation</div>
-            <div style="font-size: 2rem; font-weight: bold; color: {std_color};">{stats['std']:.0f} mg/dL</div>
-            <div style="font-size: 0.9rem; color: #4b5563; margin-top: 5px;">Target: <40 mg/dL</div>
-        </div>
-        """, unsafe_allow_html=True)
-    
-    # Add the min/max glucose row
-    st.markdown("""
-    <div style="display: flex; margin-top: 15px; gap: 15px;">
-    """, unsafe_allow_html=True)
-    
-    col1, col2 = st.columns(2)
-    
-    with col1:
-        st.markdown(f"""
-        <div style="background: rgba(16, 185, 129, 0.05); padding: 15px; border-radius: 12px; text-align: center;">
-            <div style="color: #4b5563; font-size: 1rem;">Lowest Reading</div>
-            <div style="font-size: 1.8rem; font-weight: bold; color: #eab308;">{stats['min']:.0f} mg/dL</div>
-        </div>
-        """, unsafe_allow_html=True)
-    
-    with col2:
-        st.markdown(f"""
-        <div style="background: rgba(16, 185, 129, 0.05); padding: 15px; border-radius: 12px; text-align: center;">
-            <div style="color: #4b5563; font-size: 1rem;">Highest Reading</div>
-            <div style="font-size: 1.8rem; font-weight: bold; color: #ef4444;">{stats['max']:.0f} mg/dL</div>
-        </div>
-        """, unsafe_allow_html=True)
-    
-    st.markdown("</div></div>", unsafe_allow_html=True)
 
-def plot_distribution(df):
-    """Create enhanced glucose distribution plot"""
-    if df.empty:
-        return
-    
-    st.markdown("""
-    <div style="background: white; padding: 20px; border-radius: 15px; 
-              box-shadow: 0 4px 10px rgba(0,0,0,0.1); margin-bottom: 20px;
-              border-left: 8px solid #10b981;">
-    <h2 style="color: #10b981; margin-bottom: 15px;">Glucose Distribution</h2>
-    """, unsafe_allow_html=True)
-    
+    # The whole panel goes out as one HTML block: a row of 3 metrics, then min/max
+    cards = _ROW_OPEN + "".join([
+        _CARD_TPL.format(label="Average Glucose", size="2rem", color=avg_color,
+                         value=f"{stats['average']:.0f} mg/dL", note=_NOTE_TPL.format("Target: 70-180 mg/dL")),
+        _CARD_TPL.format(label="Time in Range", size="2rem", color=range_color,
+                         value=f"{stats['in_range']:.1f}%", note=_NOTE_TPL.format("Target: &gt;70%")),
+        _CARD_TPL.format(label="Standard Deviation", size="2rem", color=std_color,
+                         value=f"{stats['std']:.0f} mg/dL", note=_NOTE_TPL.format("Target: &lt;40 mg/dL")),
+    ]) + _ROW_CLOSE + _MINMAX_ROW_OPEN + "".join([
+        _CARD_TPL.format(label="Lowest Reading", size="1.8rem", color="#eab308",
+                         value=f"{stats['min']:.0f} mg/dL", note=""),
+        _CARD_TPL.format(label="Highest Reading", size="1.8rem", color="#ef4444",
+                         value=f"{stats['max']:.0f} mg/dL", note=""),
+    ]) + _ROW_CLOSE
+    st.markdown(_STATS_HEADER + cards + _PANEL_CLOSE, unsafe_allow_html=True)
+
+@st.cache_data(show_spinner=False, max_entries=8, hash_funcs={pd.DataFrame: DataProcessor.fingerprint})
+def _distribution_figure(df):
+    """Distribution chart as a figure dict, rebuilt only when the readings change"""
     # Create distribution with colored regions
     fig = make_subplots(specs=[[{"secondary_y": False}]])
     
-    # Add the histogram trace
-    hist_trace = go.Histogram(
-        x=df['sgv'],
-        nbinsx=30,
+    # Bin on the server so the chart ships a few dozen counts instead of every reading.
+    # Readings outside the edges are clipped into the end bins rather than dropped.
+    values = np.clip(df['sgv'].to_numpy(), _BIN_EDGES[0], _BIN_EDGES[-1])
+    counts, _ = np.histogram(values, bins=_BIN_EDGES)
+    hist_trace = go.Bar(
+        x=_BIN_CENTERS,
+        y=counts / _BIN_WIDTHS,
+        width=_BIN_WIDTHS,
         marker_color='rgba(16, 185, 129, 0.6)',
         name="Glucose Readings"
     )
     
     fig.add_trace(hist_trace)
     
-    # Add colored region shapes for Low, Normal, and High
-    fig.add_shape(
-        type="rect",
-        x0=0, x1=70,
-        y0=0, y1=1,
-        yref="paper",
-        fillcolor="rgba(234, 179, 8, 0.2)",
-        line=dict(width=0),
-        layer="below"
-    )
-    
-    fig.add_shape(
-        type="rect",
-        x0=70, x1=180,
-        y0=0, y1=1,
-        yref="paper",
-        fillcolor="rgba(34, 197, 94, 0.2)",
-        line=dict(width=0),
-        layer="below"
-    )
-    
-    fig.add_shape(
-        type="rect",
-        x0=180, x1=400,
-        y0=0, y1=1,
-        yref="paper",
-        fillcolor="rgba(239, 68, 68, 0.2)",
-        line=dict(width=0),
-        layer="below"
-    )
-    
-    # Add vertical lines for target range boundaries
-    fig.add_shape(
-        type="line",
-        x0=70, x1=70,
-        y0=0, y1=1,
-        yref="paper",
-        line=dict(color="rgba(34, 197, 94, 0.8)", width=2, dash="dash"),
-    )
-    
-    fig.add_shape(
-        type="line",
-        x0=180, x1=180,
-        y0=0, y1=1,
-        yref="paper",
-        line=dict(color="rgba(239, 68, 68, 0.8)", width=2, dash="dash"),
-    )
-    
-    # Add annotations
-    fig.add_annotation(
-        x=50, y=0.95,
-        text="Low",
-        showarrow=False,
-        yref="paper",
-        font=dict(size=12, color="#4b5563")
-    )
-    
-    fig.add_annotation(
-        x=125, y=0.95,
-        text="Target Range",
-        showarrow=False,
-        yref="paper",
-        font=dict(size=12, color="#4b5563")
-    )
-    
-    fig.add_annotation(
-        x=240, y=0.95,
-        text="High",
-        showarrow=False,
-        yref="paper",
-        font=dict(size=12, color="#4b5563")
-    )
-    
     # Update layout
     fig.update_layout(
         xaxis_title="Glucose (mg/dL)",
-        yaxis_title="Frequency",
+        yaxis_title="Readings per mg/dL",
         height=400,
         margin=dict(l=20, r=20, t=20, b=20),
         plot_bgcolor='rgba(0,0,0,0)',
@@ -198,8 +129,20 @@ def plot_distribution(df):
             zeroline=False
         ),
         bargap=0.05,
-        showlegend=False
+        showlegend=False,
+        shapes=_DISTRIBUTION_SHAPES,
+        annotations=_DISTRIBUTION_ANNOTATIONS
     )
     
-    st.plotly_chart(fig, use_container_width=True)
-    st.markdown("</div>", unsafe_allow_html=True)
+    return fig.to_dict()
+
+@st.fragment
+def plot_distribution(df):
+    """Create enhanced glucose distribution plot"""
+    if df.empty:
+        return
+    
+    st.markdown(_DISTRIBUTION_HEADER, unsafe_allow_html=True)
+    
+    st.plotly_chart(_distribution_figure(df), use_container_width=True)
+    st.markdown(_PANEL_CLOSE, unsafe_allow_html=True)
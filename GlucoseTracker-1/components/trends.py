@@ -1,131 +1,127 @@
 import streamlit as st
 import plotly.express as px
 import plotly.graph_objects as go
+import numpy as np
+import pandas as pd
 from datetime import timedelta
+from utils.data_processor import DataProcessor
 
-def plot_glucose_trend(df):
-    """Create an enhanced interactive glucose trend plot"""
-    if df.empty:
-        st.warning("⚠️ No data available for trend visualization")
-        return
-    
-    # Create a styled container
-    st.markdown("""
-    <div style="background: white; padding: 20px; border-radius: 15px; 
-              box-shadow: 0 4px 10px rgba(0,0,0,0.1); margin-bottom: 20px;
-              border-left: 8px solid #10b981;">
-    <h2 style="color: #10b981; margin-bottom: 15px;">Glucose Trend</h2>
-    """, unsafe_allow_html=True)
-    
+# Above this many readings the trend is downsampled before plotting
+MAX_TREND_POINTS = 500
+# Zoom choices offered under the trend chart, in hours
+ZOOM_HOURS = (6, 12, 24, 48)
+
+# Colours for low, in-range and high readings, indexed by category
+_CATEGORY_COLORS = np.array(['#eab308', '#22c55e', '#ef4444'])
+
+# Range bands, threshold lines and labels span the plot width in paper
+# coordinates, so they don't depend on the data and are built once
+_TREND_SHAPES = [
+    # Coloured range bands for low, normal, high
+    dict(type="rect", xref="paper", x0=0, x1=1, y0=0, y1=70,
+         fillcolor="rgba(234, 179, 8, 0.1)", layer="below", line_width=0, name="Low Range"),
+    dict(type="rect", xref="paper", x0=0, x1=1, y0=70, y1=180,
+         fillcolor="rgba(34, 197, 94, 0.1)", layer="below", line_width=0, name="Target Range"),
+    dict(type="rect", xref="paper", x0=0, x1=1, y0=180, y1=400,
+         fillcolor="rgba(239, 68, 68, 0.1)", layer="below", line_width=0, name="High Range"),
+    # Horizontal threshold lines
+    dict(type="line", xref="paper", x0=0, x1=1, y0=70, y1=70,
+         line=dict(color="rgba(234, 179, 8, 0.7)", width=1.5, dash="dash")),
+    dict(type="line", xref="paper", x0=0, x1=1, y0=180, y1=180,
+         line=dict(color="rgba(239, 68, 68, 0.7)", width=1.5, dash="dash")),
+]
+_TREND_ANNOTATIONS = [
+    dict(xref="paper", x=0.01, xanchor="left", y=65, text="Low", showarrow=False,
+         font=dict(size=10, color="#4b5563")),
+    dict(xref="paper", x=0.01, xanchor="left", y=185, text="High", showarrow=False,
+         font=dict(size=10, color="#4b5563")),
+]
+
+# Static panel markup, built once at import
+_TREND_HEADER = (
+    '<div style="background: white; padding: 20px; border-radius: 15px; '
+    'box-shadow: 0 4px 10px rgba(0,0,0,0.1); margin-bottom: 20px; border-left: 8px solid #10b981;">'
+    '<h2 style="color: #10b981; margin-bottom: 15px;">Glucose Trend</h2>'
+)
+_PANEL_CLOSE = '</div>'
+
+def _segments(x, y, start_mask):
+    """Join the segments starting at start_mask points into one gap-separated line
+
+    Each segment runs from a point to the next one and is followed by a NaN
+    gap, so a single trace can draw many disconnected segments.
+    """
+    idx = np.flatnonzero(start_mask)
+    seg_x = np.empty(idx.size * 3, dtype=x.dtype)
+    seg_x[0::3] = x[idx]
+    seg_x[1::3] = x[idx + 1]
+    seg_x[2::3] = x[idx + 1]
+    seg_y = np.full(idx.size * 3, np.nan)
+    seg_y[0::3] = y[idx]
+    seg_y[1::3] = y[idx + 1]
+    return seg_x, seg_y
+
+def _set_zoom(hours):
+    st.session_state.trend_zoom = hours
+
+@st.cache_data(show_spinner=False, max_entries=16, hash_funcs={pd.DataFrame: DataProcessor.fingerprint})
+def _trend_figure(df):
+    """Trend chart as a figure dict, rebuilt only when the plotted readings change"""
     # Create figure with gradient line
     fig = go.Figure()
     
-    # Calculate gradients for line segments based on values (in range, high, low)
-    line_color = []
-    for i in range(len(df) - 1):
-        # Color based on glucose range
-        if df['sgv'].iloc[i] < 70:
-            line_color.append('#eab308')  # Yellow for low
-        elif df['sgv'].iloc[i] > 180:
-            line_color.append('#ef4444')  # Red for high
-        else:
-            line_color.append('#22c55e')  # Green for in range
-    
-    # Create colored line segments for each point to the next
-    for i in range(len(df) - 1):
-        fig.add_trace(go.Scatter(
-            x=df['datetime'].iloc[i:i+2],
-            y=df['sgv'].iloc[i:i+2],
-            mode='lines',
-            line=dict(color=line_color[i], width=3),
-            showlegend=False,
-            hoverinfo='skip'
-        ))
+    x = df['datetime'].to_numpy()
+    y = df['sgv'].to_numpy(dtype=float)
+    avg = df['rolling_avg'].to_numpy() if 'rolling_avg' in df.columns else None
+
+    # Long histories are thinned to what the chart can show; LTTB keeps peaks and troughs
+    if len(df) > MAX_TREND_POINTS:
+        keep = DataProcessor.lttb_indices(x.view('int64').astype(float), y, MAX_TREND_POINTS)
+        x, y = x[keep], y[keep]
+        avg = avg[keep] if avg is not None else None
+
+    # Classify every reading in one vectorized pass: 0 low, 1 in range, 2 high
+    category = np.select([y < 70, y > 180], [0, 2], default=1)
+
+    # One line trace per range; each segment takes the colour of its starting point
+    for k, color in enumerate(_CATEGORY_COLORS):
+        seg_x, seg_y = _segments(x, y, category[:-1] == k)
+        if seg_x.size:
+            fig.add_trace(go.Scattergl(
+                x=seg_x,
+                y=seg_y,
+                mode='lines',
+                line=dict(color=color, width=3),
+                connectgaps=False,
+                showlegend=False,
+                hoverinfo='skip'
+            ))
     
     # Add markers for each reading
-    fig.add_trace(go.Scatter(
-        x=df['datetime'],
-        y=df['sgv'],
+    fig.add_trace(go.Scattergl(
+        x=x,
+        y=y,
         mode='markers',
         name='Glucose',
         marker=dict(
             size=8,
-            color=df['sgv'].apply(lambda x: '#eab308' if x < 70 else ('#ef4444' if x > 180 else '#22c55e')),
+            color=_CATEGORY_COLORS[category],
             line=dict(color='white', width=1)
         ),
         hovertemplate='<b>%{y:.0f} mg/dL</b><br>%{x|%I:%M %p}<extra></extra>'
     ))
     
     # Add rolling average as a smooth line
-    if 'rolling_avg' in df.columns:
-        fig.add_trace(go.Scatter(
-            x=df['datetime'],
-            y=df['rolling_avg'],
+    if avg is not None:
+        fig.add_trace(go.Scattergl(
+            x=x,
+            y=avg,
             mode='lines',
             name='3-Hour Average',
             line=dict(color='rgba(16, 185, 129, 0.7)', width=2, dash='dot'),
             hovertemplate='<b>Avg: %{y:.0f} mg/dL</b><extra></extra>'
         ))
     
-    # Add colored range bands for low, normal, high
-    fig.add_hrect(
-        y0=0, y1=70,
-        fillcolor="rgba(234, 179, 8, 0.1)",
-        layer="below",
-        line_width=0,
-        name="Low Range"
-    )
-    
-    fig.add_hrect(
-        y0=70, y1=180,
-        fillcolor="rgba(34, 197, 94, 0.1)",
-        layer="below",
-        line_width=0,
-        name="Target Range"
-    )
-    
-    fig.add_hrect(
-        y0=180, y1=400,
-        fillcolor="rgba(239, 68, 68, 0.1)",
-        layer="below",
-        line_width=0,
-        name="High Range"
-    )
-    
-    # Add horizontal threshold lines
-    fig.add_shape(
-        type="line",
-        x0=df['datetime'].min(), 
-        x1=df['datetime'].max(),
-        y0=70, y1=70,
-        line=dict(color="rgba(234, 179, 8, 0.7)", width=1.5, dash="dash"),
-    )
-    
-    fig.add_shape(
-        type="line",
-        x0=df['datetime'].min(), 
-        x1=df['datetime'].max(),
-        y0=180, y1=180,
-        line=dict(color="rgba(239, 68, 68, 0.7)", width=1.5, dash="dash"),
-    )
-    
-    # Add annotations for the thresholds
-    fig.add_annotation(
-        x=df['datetime'].min() + timedelta(minutes=20),
-        y=65,
-        text="Low",
-        showarrow=False,
-        font=dict(size=10, color="#4b5563")
-    )
-    
-    fig.add_annotation(
-        x=df['datetime'].min() + timedelta(minutes=20),
-        y=185,
-        text="High",
-        showarrow=False,
-        font=dict(size=10, color="#4b5563")
-    )
-    
     # Update layout with modern styling
     fig.update_layout(
         xaxis_title="Time",
@@ -152,44 +148,40 @@ def plot_glucose_trend(df):
             showgrid=True,
             zeroline=False,
             range=[max(0, df['sgv'].min() - 20), min(400, df['sgv'].max() + 20)]
-        )
+        ),
+        shapes=_TREND_SHAPES,
+        annotations=_TREND_ANNOTATIONS
     )
     
-    st.plotly_chart(fig, use_container_width=True)
-    
-    # Add time period selector buttons
-    col1, col2, col3, col4 = st.columns(4)
-    
-    with col1:
-        st.markdown("""
-        <div style="text-align: center;">
-            <button style="background: linear-gradient(90deg, #10b981, #059669); color: white; border: none; padding: 8px 15px; 
-                    border-radius: 8px; font-weight: 500; width: 100%; cursor: pointer;">6 Hours</button>
-        </div>
-        """, unsafe_allow_html=True)
-    
-    with col2:
-        st.markdown("""
-        <div style="text-align: center;">
-            <button style="background: linear-gradient(90deg, #10b981, #059669); color: white; border: none; padding: 8px 15px; 
-                    border-radius: 8px; font-weight: 500; width: 100%; cursor: pointer;">12 Hours</button>
-        </div>
-        """, unsafe_allow_html=True)
-    
-    with col3:
-        st.markdown("""
-        <div style="text-align: center;">
-            <button style="background: linear-gradient(90deg, #10b981, #059669); color: white; border: none; padding: 8px 15px; 
-                    border-radius: 8px; font-weight: 500; width: 100%; cursor: pointer;">24 Hours</button>
-        </div>
-        """, unsafe_allow_html=True)
-    
-    with col4:
-        st.markdown("""
-        <div style="text-align: center;">
-            <button style="background: linear-gradient(90deg, #10b981, #059669); color: white; border: none; padding: 8px 15px; 
-                    border-radius: 8px; font-weight: 500; width: 100%; cursor: pointer;">48 Hours</button>
-        </div>
-        """, unsafe_allow_html=True)
+    return fig.to_dict()
+
+@st.fragment
+def plot_glucose_trend(df):
+    """Create an enhanced interactive glucose trend plot"""
+    if df.empty:
+        st.warning("⚠️ No data available for trend visualization")
+        return
+
+    # Show only the most recent hours picked with the buttons below the chart
+    zoom = st.session_state.get('trend_zoom')
+    if zoom:
+        df = df[df['datetime'] >= df['datetime'].max() - timedelta(hours=zoom)]
     
-    st.markdown("</div>", unsafe_allow_html=True)
+    # Create a styled container
+    st.markdown(_TREND_HEADER, unsafe_allow_html=True)
+    
+    st.plotly_chart(_trend_figure(df), use_container_width=True)
+    
+    # Time period buttons zoom the chart; clicking reruns only this fragment
+    for col, hours in zip(st.columns(len(ZOOM_HOURS)), ZOOM_HOURS):
+        with col:
+            st.button(
+                f"{hours} Hours",
+                key=f"trend_zoom_{hours}",
+                type="primary" if hours == zoom else "secondary",
+                on_click=_set_zoom,
+                args=(hours,),
+                use_container_width=True
+            )
+    
+    st.markdown(_PANEL_CLOSE, unsafe_allow_html=True)
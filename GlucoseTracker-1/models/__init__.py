@@ -1,9 +1,51 @@
+from functools import lru_cache
+from sqlalchemy import inspect, text
 from .base import Base, engine, get_db
 from .models import User, GlucoseReading
 
+_READING_KEY = ['user_id', 'timestamp']
+
+def _ensure_reading_unique_index():
+    """Add the (user_id, timestamp) unique index to tables created before it existed
+
+    create_all doesn't alter existing tables, and older versions stored the same
+    Nightscout reading many times. Rows that are identical in every column but
+    id are collapsed to the lowest id; if a user still has different readings
+    at one timestamp, nothing is changed and startup stops so they can be
+    resolved by hand. Safe to run repeatedly; it does nothing once the index
+    is in place.
+    """
+    inspector = inspect(engine)
+    table = GlucoseReading.__tablename__
+    if any(c['column_names'] == _READING_KEY for c in inspector.get_unique_constraints(table)):
+        return
+    if any(i['unique'] and i['column_names'] == _READING_KEY for i in inspector.get_indexes(table)):
+        return
+
+    # One transaction: a conflict below rolls back the duplicate cleanup too
+    with engine.begin() as conn:
+        conn.execute(text(
+            f"DELETE FROM {table} WHERE id NOT IN "
+            f"(SELECT MIN(id) FROM {table} "
+            f"GROUP BY user_id, timestamp, glucose_value, source, notes)"
+        ))
+        conflicts = conn.execute(text(
+            f"SELECT COUNT(*) FROM (SELECT 1 FROM {table} WHERE timestamp IS NOT NULL "
+            f"GROUP BY user_id, timestamp HAVING COUNT(*) > 1) AS c"
+        )).scalar()
+        if conflicts:
+            raise RuntimeError(
+                f"{table} has {conflicts} user/timestamp pairs with differing readings, "
+                f"so the uq_reading_user_ts index can't be added. Merge or remove those "
+                f"rows, then create the index: CREATE UNIQUE INDEX uq_reading_user_ts "
+                f"ON {table} (user_id, timestamp)"
+            )
+        conn.execute(text(
+            f"CREATE UNIQUE INDEX IF NOT EXISTS uq_reading_user_ts ON {table} (user_id, timestamp)"
+        ))
+
+@lru_cache(maxsize=1)
 def init_db():
-    # Create all tables
+    # Create all tables; cached so only the first call per process touches the database
     Base.metadata.create_all(bind=engine)
-
-# Initialize database tables
-init_db()
\ No newline at end of file
+    _ensure_reading_unique_index()
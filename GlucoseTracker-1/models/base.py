@@ -1,6 +1,7 @@
 from sqlalchemy import create_engine
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import scoped_session, sessionmaker
+from contextlib import contextmanager
 import os
 
 # Get database URL from environment
@@ -12,13 +13,37 @@ if not DATABASE_URL:
 if DATABASE_URL.startswith("postgres://"):
     DATABASE_URL = DATABASE_URL.replace("postgres://", "postgresql://", 1)
 
-engine = create_engine(DATABASE_URL)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# Bounded pool: extra sessions wait for a free connection instead of opening
+# new ones. For Postgres deployments with many workers, put pgbouncer in front
+# (pool_mode=transaction) so the total server connection count stays fixed.
+# Connections are recycled before typical server/proxy idle timeouts.
+engine = create_engine(
+    DATABASE_URL,
+    pool_size=20,
+    max_overflow=10,
+    pool_pre_ping=True,
+    pool_recycle=1800
+)
+# One session per thread; objects stay loaded after commit, so no re-SELECTs
+SessionLocal = scoped_session(
+    sessionmaker(autocommit=False, autoflush=False, expire_on_commit=False, bind=engine)
+)
 Base = declarative_base()
 
-def get_db():
-    db = SessionLocal()
+@contextmanager
+def session_scope():
+    """The current thread's session, removed when the outermost scope exits
+
+    Nested scopes, like a fragment drawn inside the main page, share the
+    caller's session and identity map instead of closing it under them.
+    """
+    outermost = not SessionLocal.registry.has()
     try:
-        yield db
+        yield SessionLocal()
     finally:
-        db.close()
\ No newline at end of file
+        if outermost:
+            SessionLocal.remove()
+
+def get_db():
+    with session_scope() as db:
+        yield db
\ No newline at end of file
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, Text
+from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, Text, UniqueConstraint
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from .base import Base
@@ -15,10 +15,15 @@ class User(Base):
 
 class GlucoseReading(Base):
     __tablename__ = "glucose_readings"
+    __table_args__ = (
+        # One reading per user per timestamp, so re-synced Nightscout data is skipped.
+        # Its (user_id, timestamp) index also serves per-user time-window queries.
+        UniqueConstraint('user_id', 'timestamp', name='uq_reading_user_ts'),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"))
-    timestamp = Column(DateTime, index=True)
+    timestamp = Column(DateTime)
     glucose_value = Column(Float)
     source = Column(String)  # 'nightscout' or 'manual'
     notes = Column(Text, nullable=True)
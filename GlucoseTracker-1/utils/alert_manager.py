@@ -1,10 +1,99 @@
 from typing import Optional
 import os
 import smtplib
+import threading
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
-from twilio.rest import Client
 from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from string import Template
+
+# Alert email bodies, parsed once at import and filled in per alert
+_EMAIL_HTML_TPL = Template("""
+<html>
+    <head>
+        <style>
+            body {
+                font-family: Arial, sans-serif;
+                margin: 0;
+                padding: 0;
+                background-color: #f4f4f4;
+            }
+            .container {
+                width: 90%;
+                max-width: 600px;
+                margin: 20px auto;
+                background: white;
+                border-radius: 10px;
+                overflow: hidden;
+                box-shadow: 0 0 10px rgba(0,0,0,0.1);
+            }
+            .header {
+                background-color: $color;
+                color: white;
+                padding: 20px;
+                text-align: center;
+            }
+            .content {
+                padding: 20px;
+            }
+            .value {
+                font-size: 48px;
+                font-weight: bold;
+                text-align: center;
+                margin: 20px 0;
+                color: $color;
+            }
+            .details {
+                margin: 20px 0;
+                border-top: 1px solid #ddd;
+                border-bottom: 1px solid #ddd;
+                padding: 15px 0;
+            }
+            .footer {
+                text-align: center;
+                font-size: 12px;
+                color: #999;
+                padding: 10px 20px 20px;
+            }
+        </style>
+    </head>
+    <body>
+        <div class="container">
+            <div class="header">
+                <h1>$alert_heading</h1>
+            </div>
+            <div class="content">
+                <p>Your glucose level is currently:</p>
+                <div class="value">$value mg/dL</div>
+                <div class="details">
+                    <p><strong>Time:</strong> $time_str</p>
+                    <p><strong>Date:</strong> $date_str</p>
+                    <p><strong>Status:</strong> $status</p>
+                </div>
+                <p>Please take appropriate action according to your diabetes management plan.</p>
+            </div>
+            <div class="footer">
+                <p>This is an automated alert from your Diabetes Management Dashboard. Please do not reply to this email.</p>
+            </div>
+        </div>
+    </body>
+</html>
+""")
+
+_EMAIL_TEXT_TPL = Template("""
+$alert_heading
+
+Your glucose level is currently: $value mg/dL
+
+Time: $time_str
+Date: $date_str
+Status: $status
+
+Please take appropriate action according to your diabetes management plan.
+
+This is an automated alert from your Diabetes Management Dashboard.
+""")
 
 class AlertManager:
     """
@@ -21,6 +110,10 @@ class AlertManager:
     email_sender = "diabetes.monitor.alerts@gmail.com"
     email_password = None  # Will be set up later via environment variable
     
+    # Shared SMTP connection, reused across alerts so each email skips the TLS handshake and login
+    _smtp = None
+    _smtp_lock = threading.Lock()
+    
     @classmethod
     def _initialize_client(cls):
         """Initialize or reinitialize the Twilio client and email credentials"""
@@ -34,6 +127,8 @@ class AlertManager:
             cls.email_password = os.environ.get('EMAIL_PASSWORD')
             
             if account_sid and auth_token:
+                # Imported here so the app doesn't load Twilio unless SMS is configured
+                from twilio.rest import Client
                 cls.client = Client(account_sid, auth_token)
                 print("Twilio client initialized successfully")
             else:
@@ -47,6 +142,35 @@ class AlertManager:
             cls.client = None
             print(f"Failed to initialize alert clients: {str(e)}")
     
+    @classmethod
+    def _get_smtp(cls) -> smtplib.SMTP:
+        """Return the shared SMTP connection, reconnecting if it has gone stale
+
+        Callers must hold _smtp_lock.
+        """
+        if cls._smtp is not None:
+            try:
+                cls._smtp.noop()
+                return cls._smtp
+            except (smtplib.SMTPException, OSError):
+                cls._close_smtp()
+        
+        server = smtplib.SMTP(cls.smtp_server, cls.smtp_port)
+        server.starttls()
+        server.login(cls.email_sender, cls.email_password)
+        cls._smtp = server
+        return server
+    
+    @classmethod
+    def _close_smtp(cls):
+        """Drop the shared SMTP connection, ignoring errors from an already dead socket"""
+        if cls._smtp is not None:
+            try:
+                cls._smtp.quit()
+            except (smtplib.SMTPException, OSError):
+                pass
+            cls._smtp = None
+    
     @classmethod
     def can_send_alerts(cls) -> bool:
         """Check if the system is properly configured to send alerts (either SMS or email)"""
@@ -105,92 +229,23 @@ class AlertManager:
             alert_heading = "GLUCOSE ALERT"
             
         # Create a nice HTML email with styling
-        html_message = f"""
-        <html>
-            <head>
-                <style>
-                    body {{
-                        font-family: Arial, sans-serif;
-                        margin: 0;
-                        padding: 0;
-                        background-color: #f4f4f4;
-                    }}
-                    .container {{
-                        width: 90%;
-                        max-width: 600px;
-                        margin: 20px auto;
-                        background: white;
-                        border-radius: 10px;
-                        overflow: hidden;
-                        box-shadow: 0 0 10px rgba(0,0,0,0.1);
-                    }}
-                    .header {{
-                        background-color: {color};
-                        color: white;
-                        padding: 20px;
-                        text-align: center;
-                    }}
-                    .content {{
-                        padding: 20px;
-                    }}
-                    .value {{
-                        font-size: 48px;
-                        font-weight: bold;
-                        text-align: center;
-                        margin: 20px 0;
-                        color: {color};
-                    }}
-                    .details {{
-                        margin: 20px 0;
-                        border-top: 1px solid #ddd;
-                        border-bottom: 1px solid #ddd;
-                        padding: 15px 0;
-                    }}
-                    .footer {{
-                        text-align: center;
-                        font-size: 12px;
-                        color: #999;
-                        padding: 10px 20px 20px;
-                    }}
-                </style>
-            </head>
-            <body>
-                <div class="container">
-                    <div class="header">
-                        <h1>{alert_heading}</h1>
-                    </div>
-                    <div class="content">
-                        <p>Your glucose level is currently:</p>
-                        <div class="value">{glucose_value:.0f} mg/dL</div>
-                        <div class="details">
-                            <p><strong>Time:</strong> {time_str}</p>
-                            <p><strong>Date:</strong> {date_str}</p>
-                            <p><strong>Status:</strong> {alert_type.upper()}</p>
-                        </div>
-                        <p>Please take appropriate action according to your diabetes management plan.</p>
-                    </div>
-                    <div class="footer">
-                        <p>This is an automated alert from your Diabetes Management Dashboard. Please do not reply to this email.</p>
-                    </div>
-                </div>
-            </body>
-        </html>
-        """
+        html_message = _EMAIL_HTML_TPL.substitute(
+            color=color,
+            alert_heading=alert_heading,
+            value=f"{glucose_value:.0f}",
+            time_str=time_str,
+            date_str=date_str,
+            status=alert_type.upper(),
+        )
         
         # Plain text alternative
-        text_message = f"""
-        {alert_heading}
-        
-        Your glucose level is currently: {glucose_value:.0f} mg/dL
-        
-        Time: {time_str}
-        Date: {date_str}
-        Status: {alert_type.upper()}
-        
-        Please take appropriate action according to your diabetes management plan.
-        
-        This is an automated alert from your Diabetes Management Dashboard.
-        """
+        text_message = _EMAIL_TEXT_TPL.substitute(
+            alert_heading=alert_heading,
+            value=f"{glucose_value:.0f}",
+            time_str=time_str,
+            date_str=date_str,
+            status=alert_type.upper(),
+        )
         
         try:
             # Create message container
@@ -205,11 +260,16 @@ class AlertManager:
             
             # Connect to the server and send
             if cls.email_password:
-                server = smtplib.SMTP(cls.smtp_server, cls.smtp_port)
-                server.starttls()
-                server.login(cls.email_sender, cls.email_password)
-                server.send_message(msg)
-                server.quit()
+                with cls._smtp_lock:
+                    # A stale pooled connection is caught by the NOOP check and replaced here
+                    server = cls._get_smtp()
+                    try:
+                        server.send_message(msg)
+                    except (smtplib.SMTPException, OSError):
+                        # The server may already have accepted the message, so don't resend;
+                        # just drop the connection so the next alert starts fresh
+                        cls._close_smtp()
+                        raise
             
             print(f"Email alert sent to {to_email}")
             return True
@@ -217,6 +277,42 @@ class AlertManager:
             print(f"Failed to send email alert: {str(e)}")
             return False
     
+    @classmethod
+    def _send_sms(cls,
+                  to_number: str,
+                  glucose_value: float,
+                  timestamp: Optional[datetime] = None,
+                  alert_type: str = "high") -> bool:
+        """Send an SMS alert via Twilio, returning True if it was sent"""
+        try:
+            # Create alert message based on type
+            time_str = timestamp.strftime("%I:%M %p") if timestamp else datetime.now().strftime("%I:%M %p")
+            
+            if alert_type.lower() == "high":
+                message = f"⚠️ HIGH GLUCOSE ALERT: Your glucose level is {glucose_value:.0f} mg/dL at {time_str}, which is above your target range."
+            elif alert_type.lower() == "low":
+                message = f"⚠️ LOW GLUCOSE ALERT: Your glucose level is {glucose_value:.0f} mg/dL at {time_str}, which is below your target range."
+            else:
+                message = f"GLUCOSE ALERT: Your glucose level is {glucose_value:.0f} mg/dL at {time_str}."
+            
+            # Make sure client is initialized
+            if cls.client is None:
+                cls._initialize_client()
+            
+            if cls.client and cls.from_number:
+                # Send SMS via Twilio
+                sms = cls.client.messages.create(
+                    body=message,
+                    from_=cls.from_number,
+                    to=to_number
+                )
+                print(f"Alert sent to {to_number}, SID: {sms.sid}")
+                return True
+            print("SMS alerts not configured properly")
+        except Exception as e:
+            print(f"Failed to send SMS alert: {str(e)}")
+        return False
+    
     @classmethod
     def send_glucose_alert(cls, 
                          to_number: Optional[str] = None, 
@@ -237,50 +333,25 @@ class AlertManager:
         Returns:
         - bool: True if at least one message was sent successfully, False otherwise
         """
-        success = False
-        
-        # Try to send SMS alert
-        if to_number:
-            try:
-                # Create alert message based on type
-                time_str = timestamp.strftime("%I:%M %p") if timestamp else datetime.now().strftime("%I:%M %p")
-                
-                if alert_type.lower() == "high":
-                    message = f"⚠️ HIGH GLUCOSE ALERT: Your glucose level is {glucose_value:.0f} mg/dL at {time_str}, which is above your target range."
-                elif alert_type.lower() == "low":
-                    message = f"⚠️ LOW GLUCOSE ALERT: Your glucose level is {glucose_value:.0f} mg/dL at {time_str}, which is below your target range."
-                else:
-                    message = f"GLUCOSE ALERT: Your glucose level is {glucose_value:.0f} mg/dL at {time_str}."
-                
-                # Make sure client is initialized
-                if cls.client is None:
-                    cls._initialize_client()
-                
-                if cls.client and cls.from_number:
-                    # Send SMS via Twilio
-                    sms = cls.client.messages.create(
-                        body=message,
-                        from_=cls.from_number,
-                        to=to_number
-                    )
-                    print(f"Alert sent to {to_number}, SID: {sms.sid}")
-                    success = True
-                else:
-                    print("SMS alerts not configured properly")
-            except Exception as e:
-                print(f"Failed to send SMS alert: {str(e)}")
-        
-        # Try to send email alert
-        if to_email:
-            try:
-                email_sent = cls.send_email_alert(
+        # SMS and email go out in parallel so the alert takes as long as the slower channel
+        with ThreadPoolExecutor(max_workers=2) as pool:
+            futures = []
+            if to_number:
+                futures.append(pool.submit(cls._send_sms, to_number, glucose_value, timestamp, alert_type))
+            if to_email:
+                futures.append(pool.submit(
+                    cls.send_email_alert,
                     to_email=to_email,
                     glucose_value=glucose_value,
                     timestamp=timestamp,
                     alert_type=alert_type
-                )
-                success = success or email_sent
-            except Exception as e:
-                print(f"Failed to send email alert: {str(e)}")
-                
-        return success
\ No newline at end of file
+                ))
+            
+            success = False
+            for future in as_completed(futures):
+                try:
+                    success = future.result() or success
+                except Exception as e:
+                    print(f"Failed to send alert: {str(e)}")
+        
+        return success
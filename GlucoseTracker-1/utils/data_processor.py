@@ -1,8 +1,54 @@
 import pandas as pd
 import numpy as np
+import hashlib
 from datetime import datetime
 
+# Nightscout direction names and their arrow symbols
+_ARROWS = {
+    'DoubleUp': '↑↑',
+    'SingleUp': '↑',
+    'FortyFiveUp': '↗',
+    'Flat': '→',
+    'FortyFiveDown': '↘',
+    'SingleDown': '↓',
+    'DoubleDown': '↓↓',
+    'NONE': '-'
+}
+
+def _rolling_mean_std(values, window):
+    """Rolling mean and sample std from running sums, like rolling(window).mean()/.std()
+
+    Both come from one cumulative sum of the values and their squares, so the
+    array is walked once instead of once per statistic. The first window-1
+    positions are NaN.
+    """
+    mean = np.full(values.size, np.nan)
+    std = np.full(values.size, np.nan)
+    if values.size < window:
+        return mean, std
+    sums = np.cumsum(np.concatenate(([0.0], values)))
+    squares = np.cumsum(np.concatenate(([0.0], values * values)))
+    window_sum = sums[window:] - sums[:-window]
+    window_sq = squares[window:] - squares[:-window]
+    mean[window - 1:] = window_sum / window
+    variance = (window_sq - window_sum * mean[window - 1:]) / (window - 1)
+    std[window - 1:] = np.sqrt(np.maximum(variance, 0.0))
+    return mean, std
+
 class DataProcessor:
+    @staticmethod
+    def fingerprint(df):
+        """Content hash of a glucose frame, used as its cache key
+
+        The caches it keys are shared by every user of the process, so every
+        row and column goes into the hash; two frames only share a key when
+        their data is the same.
+        """
+        digest = hashlib.blake2b(digest_size=16)
+        digest.update(','.join(map(str, df.columns)).encode())
+        digest.update(pd.util.hash_pandas_object(df, index=False).to_numpy().tobytes())
+        return (len(df), digest.hexdigest())
+
     @staticmethod
     def process_glucose_data(df):
         """Process raw glucose data"""
@@ -12,9 +58,14 @@ class DataProcessor:
         # Convert timestamp to datetime
         df['datetime'] = pd.to_datetime(df['date'], unit='ms')
         
-        # Calculate basic statistics
-        df['rolling_avg'] = df['sgv'].rolling(window=12).mean()
-        df['rolling_std'] = df['sgv'].rolling(window=12).std()
+        # Calculate basic statistics; accumulate in float64, then store float32
+        # since glucose values are small and float32 halves the data the charts move
+        rolling_avg, rolling_std = _rolling_mean_std(
+            df['sgv'].to_numpy(dtype=np.float64), window=12
+        )
+        df['sgv'] = df['sgv'].astype(np.float32)
+        df['rolling_avg'] = rolling_avg.astype(np.float32)
+        df['rolling_std'] = rolling_std.astype(np.float32)
         
         return df
 
@@ -24,27 +75,61 @@ class DataProcessor:
         if df.empty:
             return {}
         
+        # Reduce over the raw array; pandas reductions add Series overhead per call
+        values = df['sgv'].to_numpy(dtype=np.float64)
+        n = values.size
+        
+        # Mean and std from the first two moments instead of separate passes
+        total = values.sum()
+        mean = total / n
+        var = (np.dot(values, values) - total * mean) / (n - 1) if n > 1 else np.nan
+        
+        # Build the in-range mask in place rather than ANDing two temporaries
+        in_range = values >= 70
+        in_range &= values <= 180
+        
         stats = {
-            'current': df['sgv'].iloc[0],
-            'average': df['sgv'].mean(),
-            'std': df['sgv'].std(),
-            'max': df['sgv'].max(),
-            'min': df['sgv'].min(),
-            'in_range': ((df['sgv'] >= 70) & (df['sgv'] <= 180)).mean() * 100
+            'current': values[0],
+            'average': mean,
+            'std': np.sqrt(max(var, 0.0)),
+            'max': values.max(),
+            'min': values.min(),
+            'in_range': np.count_nonzero(in_range) / n * 100
         }
         return stats
 
+    @staticmethod
+    def lttb_indices(x, y, n_out):
+        """Indices of the points kept by Largest-Triangle-Three-Buckets downsampling
+
+        Keeps the first and last points and, from each bucket in between, the
+        point forming the largest triangle with its neighbours, so peaks and
+        troughs survive. x must be numeric and ordered.
+        """
+        n = len(x)
+        if n_out >= n or n_out < 3:
+            return np.arange(n)
+
+        every = (n - 2) / (n_out - 2)
+        keep = np.empty(n_out, dtype=np.int64)
+        keep[0], keep[-1] = 0, n - 1
+        a = 0
+        for i in range(n_out - 2):
+            start = int(i * every) + 1
+            end = int((i + 1) * every) + 1
+            next_end = min(int((i + 2) * every) + 1, n)
+            # Average of the next bucket is the third triangle vertex
+            avg_x = x[end:next_end].mean()
+            avg_y = y[end:next_end].mean()
+            area = np.abs(
+                (x[a] - avg_x) * (y[start:end] - y[a])
+                - (x[a] - x[start:end]) * (avg_y - y[a])
+            )
+            a = start + int(np.argmax(area))
+            keep[i + 1] = a
+        return keep
+
     @staticmethod
     def get_trend_arrow(direction):
         """Convert Nightscout direction to arrow symbol"""
-        arrows = {
-            'DoubleUp': '↑↑',
-            'SingleUp': '↑',
-            'FortyFiveUp': '↗',
-            'Flat': '→',
-            'FortyFiveDown': '↘',
-            'SingleDown': '↓',
-            'DoubleDown': '↓↓',
-            'NONE': '-'
-        }
-        return arrows.get(direction, '-')
+        return _ARROWS.get(direction, '-')
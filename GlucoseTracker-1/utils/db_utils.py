@@ -1,14 +1,49 @@
-from sqlalchemy.orm import Session
+from sqlalchemy import func
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session, selectinload
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from datetime import datetime, timedelta
 from models.models import User, GlucoseReading
-from typing import List, Optional
+from utils.nightscout_api import SAMPLE_URL
+from typing import Iterator, List, Optional
+from collections import OrderedDict
+import threading
+
+def _insert_for(db: Session):
+    """Pick the dialect-specific insert so ON CONFLICT DO NOTHING is available"""
+    return pg_insert if db.get_bind().dialect.name == 'postgresql' else sqlite_insert
+
+# email -> user id for the most recently seen users, filled by get_or_create_user;
+# ids never change once assigned, so entries only leave by eviction
+_USER_ID_CACHE_SIZE = 1024
+_user_ids = OrderedDict()
+_user_ids_lock = threading.Lock()
+
+def _cached_user_id(email: str) -> Optional[int]:
+    with _user_ids_lock:
+        user_id = _user_ids.get(email)
+        if user_id is not None:
+            _user_ids.move_to_end(email)
+        return user_id
+
+def _remember_user_id(email: str, user_id: int) -> None:
+    with _user_ids_lock:
+        _user_ids[email] = user_id
+        _user_ids.move_to_end(email)
+        if len(_user_ids) > _USER_ID_CACHE_SIZE:
+            _user_ids.popitem(last=False)
 
 class DatabaseManager:
     @staticmethod
     def get_or_create_user(db: Session, email: str, nightscout_url: str, phone_number: Optional[str] = None) -> Optional[User]:
         """Get existing user or create a new one"""
         try:
-            user = db.query(User).filter(User.email == email).first()
+            # Known emails go straight to the primary key instead of the email lookup
+            user_id = _cached_user_id(email)
+            user = db.get(User, user_id) if user_id is not None else None
+            if user is None:
+                user = db.query(User).filter(User.email == email).first()
             if not user:
                 # Create new user with constructor
                 user = User(
@@ -18,19 +53,34 @@ class DatabaseManager:
                 )
                 db.add(user)
                 db.commit()
-                db.refresh(user)
             else:
                 # Update existing user with new data if provided
-                if nightscout_url and nightscout_url != "https://your-nightscout-url.herokuapp.com":
-                    setattr(user, 'nightscout_url', nightscout_url)
-                if phone_number:
-                    setattr(user, 'phone_number', phone_number)
-                db.commit()
-                db.refresh(user)
+                dirty = False
+                if nightscout_url and nightscout_url != SAMPLE_URL and nightscout_url != user.nightscout_url:
+                    user.nightscout_url = nightscout_url
+                    dirty = True
+                if phone_number and phone_number != user.phone_number:
+                    user.phone_number = phone_number
+                    dirty = True
+                # Most reruns change nothing, so skip the write entirely
+                if dirty:
+                    db.commit()
+            _remember_user_id(email, user.id)
             return user
-        except Exception as e:
+        except SQLAlchemyError:
             db.rollback()
-            raise Exception(f"Database error: {str(e)}")
+            raise
+
+    @staticmethod
+    def get_user_with_readings(db: Session, email: str) -> Optional[User]:
+        """Get a user with their glucose readings loaded in one extra query
+
+        Use this instead of get_or_create_user when user.glucose_readings will be
+        traversed, so the readings don't lazy-load attribute by attribute.
+        """
+        return db.query(User).options(
+            selectinload(User.glucose_readings)
+        ).filter(User.email == email).first()
 
     @staticmethod
     def save_glucose_reading(
@@ -41,37 +91,72 @@ class DatabaseManager:
         source: str,
         notes: Optional[str] = None
     ) -> Optional[GlucoseReading]:
-        """Save a new glucose reading"""
+        """Save a new glucose reading
+
+        Returns None when the user already has a reading at this timestamp.
+        Relies on the uq_reading_user_ts index, which init_db() adds to older
+        databases, so call init_db() before saving.
+        """
         try:
-            # Create reading with dictionary to avoid attribute assignment issues
-            reading = GlucoseReading(
+            stmt = _insert_for(db)(GlucoseReading).values(
                 user_id=user.id,
                 glucose_value=glucose_value,
                 timestamp=timestamp,
                 source=source,
                 notes=notes
-            )
-                
-            db.add(reading)
+            ).on_conflict_do_nothing(
+                index_elements=['user_id', 'timestamp']
+            ).returning(GlucoseReading)
+            reading = db.scalars(stmt).first()
             db.commit()
-            db.refresh(reading)
             return reading
-        except Exception as e:
+        except SQLAlchemyError:
             db.rollback()
-            raise Exception(f"Failed to save glucose reading: {str(e)}")
+            raise
+
+    @staticmethod
+    def bulk_save_readings(db: Session, user, records: List[dict]) -> None:
+        """Save many glucose readings in one statement, skipping ones already stored
+
+        Each record holds glucose_value, timestamp, source and optionally notes.
+        Like save_glucose_reading, this needs init_db() to have run.
+        """
+        if not records:
+            return
+        try:
+            # executemany form: the driver batches the rows, and long histories
+            # can't overflow the bound-parameter limit of one multi-row VALUES
+            stmt = _insert_for(db)(GlucoseReading).on_conflict_do_nothing(
+                index_elements=['user_id', 'timestamp']
+            )
+            db.execute(stmt, [{'user_id': user.id, 'notes': None, **record} for record in records])
+            db.commit()
+        except SQLAlchemyError:
+            db.rollback()
+            raise
+
+    @staticmethod
+    def latest_reading_id(db: Session, user_id: int) -> Optional[int]:
+        """Id of the user's newest stored reading; changes whenever a reading is added"""
+        return db.query(func.max(GlucoseReading.id)).filter(
+            GlucoseReading.user_id == user_id
+        ).scalar()
 
     @staticmethod
     def get_user_readings(
         db: Session,
         user_id: int,
         hours: int = 24
-    ) -> List[GlucoseReading]:
-        """Get user's glucose readings for the specified time period"""
-        try:
-            since = datetime.utcnow() - timedelta(hours=hours)
-            return db.query(GlucoseReading).filter(
-                GlucoseReading.user_id == user_id,
-                GlucoseReading.timestamp >= since
-            ).order_by(GlucoseReading.timestamp.desc()).all()
-        except Exception as e:
-            raise Exception(f"Failed to fetch glucose readings: {str(e)}")
\ No newline at end of file
+    ) -> Iterator[GlucoseReading]:
+        """Get user's glucose readings for the specified time period
+
+        Rows are streamed in batches of 500, newest first, so consume the
+        iterator while the session is still open.
+        """
+        since = datetime.utcnow() - timedelta(hours=hours)
+        # Served by the uq_reading_user_ts index: a range scan read backwards, no sort
+        query = db.query(GlucoseReading).filter(
+            GlucoseReading.user_id == user_id,
+            GlucoseReading.timestamp >= since
+        ).order_by(GlucoseReading.timestamp.desc())
+        return iter(query.execution_options(stream_results=True).yield_per(500))
\ No newline at end of file
@@ -1,82 +1,316 @@
 import requests
-from datetime import datetime, timedelta
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import pandas as pd
+import numpy as np
 import random
+import time
+import threading
+import asyncio
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+
+try:
+    # orjson parses the entry arrays several times faster when it is installed
+    from orjson import loads as _json_loads
+except ImportError:
+    from json import loads as _json_loads
+
+# Placeholder URL prefilled in the settings; it serves generated sample data
+SAMPLE_URL = "https://your-nightscout-url.herokuapp.com"
+
+# Seconds a fetched result is reused; CGMs only post a new reading every 5 minutes
+CURRENT_TTL = 60
+HISTORY_TTL = 120
+
+# Connect/read timeouts per attempt, and how many times a failed request is retried
+_TIMEOUT = (3, 5)
+_RETRIES = 1
+_BACKOFF = 0.3
+# Overall wait for a pooled call: every attempt timing out, plus retry backoff,
+# plus a second of slack, so a worker is normally done by the time its caller gives up
+_RESULT_TIMEOUT = (
+    (_RETRIES + 1) * sum(_TIMEOUT)
+    + sum(_BACKOFF * 2 ** k for k in range(_RETRIES))
+    + 1
+)
+
+# Shared by every client so a slow Nightscout host can't grow the thread count
+_MAX_WORKERS = 8
+_EXECUTOR = ThreadPoolExecutor(max_workers=_MAX_WORKERS, thread_name_prefix='nightscout')
+
+_SAMPLE_DIRECTIONS = np.array(['Flat', 'FortyFiveUp', 'FortyFiveDown'])
 
 class NightscoutAPI:
     def __init__(self, base_url):
         self.base_url = base_url.rstrip('/')
-        self.dev_mode = base_url == "https://your-nightscout-url.herokuapp.com"
+        self.dev_mode = base_url == SAMPLE_URL
+
+        # Built once; each poll only adds the parts that change
+        self._entries_url = f"{self.base_url}/api/v1/entries/sgv"
+        # Only the fields the dashboard uses
+        self._base_params = {'fields': 'sgv,date,direction'}
+        self._current_params = {'count': 1}
+
+        # One pooled session per API instance so repeated polls reuse the TLS connection
+        self.session = requests.Session()
+        self.session.headers['Accept-Encoding'] = 'gzip'
+        adapter = HTTPAdapter(
+            pool_connections=2,
+            pool_maxsize=4,
+            max_retries=Retry(total=_RETRIES, backoff_factor=_BACKOFF)
+        )
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+        # key -> (expiry, value), see _cached/_store
+        self._cache = {}
+
+        # hours -> (readings, newest date in ms), see get_glucose_window
+        self._windows = {}
+        self._window_lock = threading.Lock()
+
+    def get_glucose_data(self, hours=24, since_ms=None):
+        """Fetch glucose data from Nightscout API
 
-    def get_glucose_data(self, hours=24):
-        """Fetch glucose data from Nightscout API"""
+        When since_ms is given, only readings newer than it are returned.
+        """
+        key = ('history', hours, since_ms)
+        cached = self._cached(key)
+        if cached is None:
+            cached = self._store(key, self._fetch_glucose_data(hours, since_ms), HISTORY_TTL)
+        # The cache is shared across sessions and processing works in place,
+        # so every caller gets its own frame
+        return cached.copy()
+
+    def get_glucose_arrays(self, hours=24, since_ms=None):
+        """Fetch glucose history as (dates, sgv) arrays, newest first
+
+        For callers that only plot or reduce the values and don't need a
+        DataFrame. dates is datetime64[ms] and sgv is int16.
+        """
+        key = ('arrays', hours, since_ms)
+        cached = self._cached(key)
+        if cached is not None:
+            return cached
+        sgv, dates, _ = self._fetch_entries(hours, since_ms)
+        dates = dates.view('datetime64[ms]')
+        # Shared through the cache, so callers can read but not modify them
+        sgv.flags.writeable = False
+        dates.flags.writeable = False
+        return self._store(key, (dates, sgv), HISTORY_TTL)
+
+    def _fetch_glucose_data(self, hours, since_ms):
+        sgv, dates, directions = self._fetch_entries(hours, since_ms)
+        return pd.DataFrame({'sgv': sgv, 'date': dates, 'direction': directions})
+
+    def _fetch_entries(self, hours, since_ms):
+        """Fetch entries as typed (sgv, date, direction) arrays"""
         if self.dev_mode:
-            return self._generate_sample_data(hours)
+            sgv, dates, directions = self._generate_sample_data(hours)
+            if since_ms:
+                keep = dates > since_ms
+                return sgv[keep], dates[keep], directions[keep]
+            return sgv, dates, directions
 
         try:
-            end_date = datetime.now()
-            start_date = end_date - timedelta(hours=hours)
+            end_ms = int(time.time() * 1000)
+            start_ms = end_ms - hours * 3_600_000
 
-            url = f"{self.base_url}/api/v1/entries/sgv"
             params = {
-                'find[date][$gte]': int(start_date.timestamp() * 1000),
-                'find[date][$lte]': int(end_date.timestamp() * 1000),
-                'count': 1000
+                **self._base_params,
+                'find[date][$gte]': start_ms,
+                'find[date][$lte]': end_ms,
+                # The date range does the limiting; count is only a safety cap. Keep
+                # the old 1000, raised for long windows to one entry a minute so
+                # faster CGMs aren't cut off either
+                'count': max(1000, hours * 60)
             }
+            if since_ms:
+                params['find[date][$gt]'] = since_ms
 
-            response = requests.get(url, params=params)
+            response = self._get(self._entries_url, params)
             response.raise_for_status()
 
-            data = response.json()
-            return pd.DataFrame(data)
+            # Fill typed arrays straight from the parsed entries, no dtype inference
+            data = _json_loads(response.content)
+            n = len(data)
+            sgv = np.fromiter((d['sgv'] for d in data), dtype=np.int16, count=n)
+            dates = np.fromiter((d['date'] for d in data), dtype=np.int64, count=n)
+            directions = np.array([d.get('direction') for d in data], dtype=object)
+            return sgv, dates, directions
         except requests.RequestException as e:
             raise Exception(f"Failed to fetch data from Nightscout: {str(e)}")
 
+    def query(self, hours=24):
+        """Lazy handle on the last `hours` of readings; nothing is fetched until asked"""
+        return LazyGlucoseQuery(self, hours)
+
+    def get_glucose_window(self, hours=24):
+        """Readings from the last `hours`, newest first, updated incrementally
+
+        The first call fetches the whole window; later calls only ask Nightscout
+        for readings newer than the last one seen and merge them in.
+        """
+        with self._window_lock:
+            _, since_ms = self._windows.get(hours, (None, None))
+        # Fetch without the lock so a slow Nightscout doesn't block other callers
+        new_readings = self.get_glucose_data(hours, since_ms=since_ms)
+
+        with self._window_lock:
+            # Another caller may have merged in the meantime; merge into whatever is current
+            buffer, last_date_ms = self._windows.get(hours, (None, None))
+            if buffer is None or buffer.empty:
+                buffer = new_readings
+            elif not new_readings.empty:
+                buffer = pd.concat([new_readings, buffer], ignore_index=True).drop_duplicates('date')
+                buffer = buffer.sort_values('date', ascending=False, ignore_index=True)
+
+            if not buffer.empty:
+                # Drop readings that have aged out of the window
+                cutoff = int(time.time() * 1000) - hours * 3_600_000
+                buffer = buffer[buffer['date'] >= cutoff]
+                last_date_ms = int(buffer['date'].max()) if not buffer.empty else last_date_ms
+            self._windows[hours] = (buffer, last_date_ms)
+            # The buffer is merged into on later calls, so callers get a copy
+            return buffer.copy()
+
     def get_current_glucose(self):
         """Fetch latest glucose reading"""
+        key = ('current',)
+        cached = self._cached(key)
+        if cached is None:
+            cached = self._store(key, self._fetch_current_glucose(), CURRENT_TTL)
+        return dict(cached) if cached is not None else None
+
+    def _fetch_current_glucose(self):
         if self.dev_mode:
             return self._generate_current_sample()
 
         try:
-            url = f"{self.base_url}/api/v1/entries/sgv"
-            params = {'count': 1}
-
-            response = requests.get(url, params=params)
+            response = self._get(self._entries_url, self._current_params)
             response.raise_for_status()
 
-            data = response.json()
+            data = _json_loads(response.content)
             return data[0] if data else None
         except requests.RequestException as e:
             raise Exception(f"Failed to fetch current glucose: {str(e)}")
 
-    def _generate_sample_data(self, hours):
-        """Generate sample glucose data for development"""
-        now = datetime.now()
-        dates = [now - timedelta(minutes=5*i) for i in range(hours*12)]  # 5-minute intervals
+    def _get(self, url, params):
+        """GET through the shared executor, giving up after _RESULT_TIMEOUT seconds"""
+        future = _EXECUTOR.submit(self.session.get, url, params=params, timeout=_TIMEOUT)
+        try:
+            return future.result(timeout=_RESULT_TIMEOUT)
+        except FutureTimeout:
+            # Don't leave a still-queued request behind to take a worker later
+            future.cancel()
+            raise requests.Timeout(f"No response from {url} within {_RESULT_TIMEOUT:.0f}s")
+
+    def clear_cache(self):
+        """Forget cached results so the next call goes to Nightscout"""
+        self._cache = {}
+        with self._window_lock:
+            self._windows = {}
 
-        data = []
-        base_glucose = 120
+    def _cached(self, key):
+        """Value stored under key, or None if missing or expired"""
+        entry = self._cache.get(key)
+        if entry is not None and time.monotonic() < entry[0]:
+            return entry[1]
+        return None
 
-        for date in dates:
-            # Generate realistic glucose variations
-            glucose = base_glucose + random.randint(-20, 20)
-            base_glucose = glucose  # Allow for trends
+    def _store(self, key, value, ttl):
+        """Remember value under key for ttl seconds and return it"""
+        now = time.monotonic()
+        # Drop expired entries so incremental since_ms keys don't pile up
+        self._cache = {k: v for k, v in self._cache.items() if v[0] > now}
+        if value is not None:
+            self._cache[key] = (now + ttl, value)
+        return value
 
-            # Keep within realistic ranges
-            glucose = max(60, min(250, glucose))
+    def _generate_sample_data(self, hours):
+        """Generate sample (sgv, date, direction) arrays for development"""
+        n = hours * 12  # 5-minute intervals
+        rng = np.random.default_rng()
 
-            data.append({
-                'sgv': glucose,
-                'date': int(date.timestamp() * 1000),
-                'direction': random.choice(['Flat', 'FortyFiveUp', 'FortyFiveDown'])
-            })
+        # Random walk from 120, kept within realistic ranges
+        glucose = np.clip(120 + rng.integers(-20, 21, n).cumsum(), 60, 250).astype(np.int16)
+        dates = int(time.time() * 1000) - np.arange(n, dtype=np.int64) * 300_000
 
-        return pd.DataFrame(data)
+        return glucose, dates, rng.choice(_SAMPLE_DIRECTIONS, n)
 
     def _generate_current_sample(self):
         """Generate a sample current glucose reading"""
         return {
             'sgv': random.randint(80, 180),
-            'date': int(datetime.now().timestamp() * 1000),
+            'date': int(time.time() * 1000),
             'direction': random.choice(['Flat', 'FortyFiveUp', 'FortyFiveDown'])
-        }
\ No newline at end of file
+        }
+
+class LazyGlucoseQuery:
+    """Describes a glucose history request and fetches only what a terminal call needs
+
+    latest() is answered with a single-entry request, aggregate() with typed
+    arrays, and only to_frame() builds a DataFrame. Narrowing with since()
+    returns a new query and fetches nothing.
+    """
+
+    def __init__(self, api, hours=24, since_ms=None):
+        self._api = api
+        self.hours = hours
+        self.since_ms = since_ms
+
+    def since(self, since_ms):
+        """Same query restricted to readings newer than since_ms"""
+        return LazyGlucoseQuery(self._api, self.hours, since_ms)
+
+    def latest(self):
+        """Most recent reading, fetched on its own"""
+        return self._api.get_current_glucose()
+
+    def arrays(self):
+        """(dates, sgv) arrays for the query, newest first"""
+        return self._api.get_glucose_arrays(self.hours, self.since_ms)
+
+    def aggregate(self, fn):
+        """Apply fn to the sgv array, e.g. aggregate(np.mean)"""
+        return fn(self.arrays()[1])
+
+    def to_frame(self):
+        """The full result as a DataFrame"""
+        return self._api.get_glucose_data(self.hours, self.since_ms)
+
+
+class AsyncNightscoutAPI:
+    """Async front for NightscoutAPI, for polling many sites at once
+
+    This is not async I/O: each call parks a thread from asyncio's default
+    executor while the blocking request runs on the shared 8-worker pool.
+    At most 8 requests are in flight across all clients, so gathering N
+    sites takes roughly ceil(N / 8) times the slowest request, not the
+    slowest one alone.
+    """
+
+    def __init__(self, base_url):
+        self.api = NightscoutAPI(base_url)
+
+    async def get_current_glucose(self):
+        return await asyncio.to_thread(self.api.get_current_glucose)
+
+    async def get_glucose_data(self, hours=24, since_ms=None):
+        return await asyncio.to_thread(self.api.get_glucose_data, hours, since_ms)
+
+    @staticmethod
+    async def gather_current(apis):
+        """Latest reading from each client, in order; failures are returned as exceptions"""
+        # No more calls in flight than the pool has workers, so the rest wait
+        # here instead of each holding a default-executor thread
+        limit = asyncio.Semaphore(_MAX_WORKERS)
+
+        async def current(api):
+            async with limit:
+                return await api.get_current_glucose()
+
+        return await asyncio.gather(
+            *(current(api) for api in apis),
+            return_exceptions=True
+        )